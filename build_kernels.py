@@ -0,0 +1,28 @@
+"""
+Ahead-of-time build of the amortization kernels.
+
+    python build_kernels.py
+
+produces a `kpr_kernels` extension module next to this file. kpr2.py imports
+it when present (plain native calls, no Numba/LLVM at runtime) and falls back
+to the @njit versions in kpr_math.py otherwise.
+
+Rebuild after any change to kpr_math.py: the extension is a snapshot of the
+kernels at build time. kpr2.py ignores a build older than kpr_math.py.
+"""
+import os
+
+from numba.pycc import CC
+
+import kpr_math
+
+cc = CC("kpr_kernels")
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+cc.verbose = True
+
+# Closed form only: the annuity-factor table would be embedded in the .so as a constant
+cc.export("monthly_payment", "f8(f8, f8, i8)")(kpr_math.monthly_payment_closed_form.py_func)
+cc.export("max_principal_from_dsr", "f8(f8, f8, f8, f8, i8)")(kpr_math.max_principal_from_dsr.py_func)
+
+if __name__ == "__main__":
+    cc.compile()
@@ -1,11 +1,30 @@
 
+from __future__ import annotations
+
+import math
 import os
-from typing import List
+from typing import TYPE_CHECKING, List
 
 import streamlit as st
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain_core.messages import BaseMessage
+
+# Streamlit re-executes this script on every rerun; compiled kernels, caches and
+# shared state live in these modules so they are built once per process.
+from kpr_format import decimal_trim_cached, decimal_with_commas_cached, int_cached, rupiah_cached
+from kpr_llm import stream_coalesced
+try:
+    # AOT-compiled extension built by build_kernels.py; a build older than kpr_math.py is stale
+    import kpr_kernels
+    _kpr_math_src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kpr_math.py")
+    if os.path.getmtime(kpr_kernels.__file__) < os.path.getmtime(_kpr_math_src):
+        raise ImportError("kpr_kernels is older than kpr_math.py; rerun build_kernels.py")
+    from kpr_kernels import monthly_payment, max_principal_from_dsr
+except (ImportError, OSError):
+    from kpr_math import monthly_payment, max_principal_from_dsr
 
 # -----------------------------------------------------------------------------
 # Page config
@@ -20,6 +39,7 @@ load_dotenv()  # loads .env in current working dir
 APP_TITLE = "🏠 KPR Advisor"
 DEFAULT_MODEL = "gemini-2.0-flash" 
 DEFAULT_TEMPERATURE = 0.5
+MAX_HISTORY_TURNS = 8  # user/assistant turn pairs sent to the model
 
 # Default policy knobs (you can tweak)
 DEFAULT_MAX_DSR = 0.60  # 60% of net income
@@ -29,6 +49,7 @@ CURRENCY = "IDR"
 # -----------------------------------------------------------------------------
 # Helpers
 # -----------------------------------------------------------------------------
+@st.cache_data(ttl=300)
 def resolve_google_api_key() -> str:
     """
     Priority:
@@ -46,7 +67,12 @@ def resolve_google_api_key() -> str:
     return ""
 
 
+@st.cache_resource
 def init_llm(key: str, model_name: str, temp: float) -> ChatGoogleGenerativeAI:
+    """One client per (key, model, temperature), shared across reruns and sessions."""
+    # Imported lazily: the GenAI/gRPC stack is only needed once onboarding is done
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
     return ChatGoogleGenerativeAI(model=model_name, google_api_key=key, temperature=temp)
 
 
@@ -54,14 +80,14 @@ def init_llm(key: str, model_name: str, temp: float) -> ChatGoogleGenerativeAI:
 def rupiah(x: float) -> str:
     """Rp with thousands separators, no decimals (Rp5,000)."""
     try:
-        return f"Rp{int(round(x)):,.0f}"
+        return rupiah_cached(x)
     except Exception:
         return f"Rp{x}"
 
 def fmt_int(x: float) -> str:
     """Plain number with thousands separators, no decimals (5,000)."""
     try:
-        return f"{int(round(x)):,.0f}"
+        return int_cached(x)
     except Exception:
         return str(x)
 
@@ -71,10 +97,7 @@ def fmt_decimal_trim(x: float) -> str:
     e.g. 10.0 -> '10', 10.50 -> '10.5'
     """
     try:
-        s = f"{float(x)}"
-        if "." in s:
-            s = s.rstrip("0").rstrip(".")
-        return s
+        return decimal_trim_cached(x)
     except Exception:
         return str(x)
 
@@ -84,16 +107,15 @@ def format_decimal_with_commas(x: float) -> str:
     12345.6 -> '12,345.6' ; 10000.0 -> '10,000'
     """
     try:
-        s = fmt_decimal_trim(x)
-        if "." in s:
-            int_part, frac = s.split(".", 1)
-            return f"{int(int_part):,}.{frac}"
-        else:
-            return f"{int(s):,}"
+        return decimal_with_commas_cached(x)
     except Exception:
         return str(x)
 
 # --- parsers (accept '5,000,000' and '5.000.000') -----------------------------
+_MONEY_STRIP = str.maketrans("", "", " ,.")
+_THOUSANDS_STRIP = str.maketrans("", "", " ,")
+_DECIMAL_COMMA = str.maketrans({",": ".", " ": None})
+
 def parse_money(text: str) -> float:
     """
     Parse currency-like inputs.
@@ -102,20 +124,18 @@ def parse_money(text: str) -> float:
     """
     if text is None:
         return 0.0
-    s = str(text).strip()
-    if s == "":
-        return 0.0
-    # Remove common thousand separators and spaces
-    s = s.replace(" ", "")
-    # If contains both ',' and '.', assume commas are thousands and '.' decimal
-    # For money we treat value as integer; strip both ',' and '.'
-    s = s.replace(",", "").replace(".", "")
-    if s == "" or s == "-":
+    # Strip spaces and both ',' / '.' in a single pass; money is treated as an integer value
+    s = str(text).strip().translate(_MONEY_STRIP)
+    # digits only (optional leading sign); rejects 'nan', 'inf' and exponents like '1e5'
+    digits = s[1:] if s[:1] in ("+", "-") else s
+    if not digits.isdigit():
         return 0.0
     try:
-        return float(int(s))
-    except Exception:
+        val = float(s)
+    except ValueError:
         return 0.0
+    # 309+ digits overflow to inf
+    return val if math.isfinite(val) else 0.0
 
 def parse_decimal(text: str) -> float:
     """
@@ -128,13 +148,11 @@ def parse_decimal(text: str) -> float:
     s = str(text).strip()
     if s == "":
         return 0.0
-    s = s.replace(" ", "")
-    # normalize decimal separator to '.'
-    if s.count(",") == 1 and s.count(".") == 0:
-        s = s.replace(",", ".")
+    # normalize decimal separator to '.', otherwise drop thousands commas
+    if "." not in s and s.count(",") == 1:
+        s = s.translate(_DECIMAL_COMMA)
     else:
-        # remove thousands commas
-        s = s.replace(",", "")
+        s = s.translate(_THOUSANDS_STRIP)
     try:
         return float(s)
     except Exception:
@@ -147,13 +165,16 @@ def money_text_input(label: str, key: str, placeholder: str = "") -> float:
     Uses an internal text key to avoid feedback loops.
     """
     # read current numeric value from session (default 0)
-    current_val = float(st.session_state.get(key, 0.0))
+    current_val = st.session_state.get(key, 0.0)
+    if not isinstance(current_val, float):
+        current_val = float(current_val)
     # show formatted text
     text_key = f"{key}__text"
     default_str = fmt_int(current_val)
     user_str = st.text_input(label, value=default_str, key=text_key, placeholder=placeholder)
     parsed = parse_money(user_str)
-    st.session_state[key] = parsed
+    if parsed != current_val:
+        st.session_state[key] = parsed
     return parsed
 
 def percent_text_input(label: str, key: str, placeholder: str = "", min_val: float = 0.0, max_val: float = 100.0) -> float:
@@ -161,17 +182,17 @@ def percent_text_input(label: str, key: str, placeholder: str = "", min_val: flo
     A text_input for percentage that trims trailing zeros and validates range.
     Displays like '10' or '10.5' (no trailing .0).
     """
-    current_val = float(st.session_state.get(key, 0.0))
+    current_val = st.session_state.get(key, 0.0)
+    if not isinstance(current_val, float):
+        current_val = float(current_val)
     text_key = f"{key}__text"
     default_str = format_decimal_with_commas(current_val)
     user_str = st.text_input(label, value=default_str, key=text_key, placeholder=placeholder)
     parsed = parse_decimal(user_str)
     # clamp to range
-    if parsed < min_val:
-        parsed = min_val
-    if parsed > max_val:
-        parsed = max_val
-    st.session_state[key] = parsed
+    parsed = min(max_val, max(min_val, parsed))
+    if parsed != current_val:
+        st.session_state[key] = parsed
     return parsed
 
 # -----------------------------------------------------------------------------
@@ -202,81 +223,140 @@ if not st.session_state.setup_complete:
     if "max_dsr" not in st.session_state: st.session_state["max_dsr"] = DEFAULT_MAX_DSR
     if "max_ltv" not in st.session_state: st.session_state["max_ltv"] = DEFAULT_MAX_LTV
 
-    st.session_state["nama"] = st.text_input("Nama", value=st.session_state["nama"], placeholder="Nama lengkap")
+    # Inputs are only submitted (and the script rerun) when the form button is pressed
+    with st.form("onboarding"):
+        st.session_state["nama"] = st.text_input("Nama", value=st.session_state["nama"], placeholder="Nama lengkap")
 
-    c1, c2 = st.columns(2)
-    with c1:
-        st.session_state["gaji_bersih"] = money_text_input(
-            "Gaji Bersih Bulanan (IDR)", key="gaji_bersih", placeholder="contoh: 8,500,000"
-        )
-        st.session_state["harga_properti"] = money_text_input(
-            "Harga Properti (IDR)", key="harga_properti", placeholder="contoh: 750,000,000"
-        )
-        # Tenor stays as integer number_input (clean and safe)
-        st.session_state["tenor_tahun"] = st.number_input(
-            "Tenor (tahun)", min_value=1, max_value=30, step=1, value=int(st.session_state["tenor_tahun"])
-        )
-    with c2:
-        st.session_state["pengeluaran"] = money_text_input(
-            "Total Pengeluaran Bulanan (IDR)", key="pengeluaran", placeholder="contoh: 3,000,000"
-        )
-        st.session_state["dp"] = money_text_input(
-            "Uang Muka / DP (IDR)", key="dp", placeholder="contoh: 150,000,000"
-        )
-        st.session_state["bunga_tahunan"] = percent_text_input(
-            "Bunga Tahunan (%)", key="bunga_tahunan", placeholder="contoh: 10.5", min_val=0.0, max_val=25.0
-        )
-
-    with st.expander("Kebijakan Perhitungan (opsional)"):
-        cc1, cc2 = st.columns(2)
-        with cc1:
-            # keep slider for good UX; shows no trailing .0 due to formatting later
-            st.session_state["max_dsr"] = st.slider(
-                "Batas DSR (Debt Service Ratio)", 0.10, 0.70, float(st.session_state["max_dsr"]), 0.01
+        c1, c2 = st.columns(2)
+        with c1:
+            money_text_input(
+                "Gaji Bersih Bulanan (IDR)", key="gaji_bersih", placeholder="contoh: 8,500,000"
+            )
+            money_text_input(
+                "Harga Properti (IDR)", key="harga_properti", placeholder="contoh: 750,000,000"
+            )
+            # Tenor stays as integer number_input (clean and safe)
+            st.session_state["tenor_tahun"] = st.number_input(
+                "Tenor (tahun)", min_value=1, max_value=30, step=1, value=int(st.session_state["tenor_tahun"])
+            )
+        with c2:
+            money_text_input(
+                "Total Pengeluaran Bulanan (IDR)", key="pengeluaran", placeholder="contoh: 3,000,000"
             )
-        with cc2:
-            st.session_state["max_ltv"] = st.slider(
-                "Batas Maks LTV (Loan-to-Value)", 0.5, 1.0, float(st.session_state["max_ltv"]), 0.01
+            money_text_input(
+                "Uang Muka / DP (IDR)", key="dp", placeholder="contoh: 150,000,000"
+            )
+            percent_text_input(
+                "Bunga Tahunan (%)", key="bunga_tahunan", placeholder="contoh: 10.5", min_val=0.0, max_val=25.0
             )
 
-    st.caption("**Catatan:** angka-angka ini simulasi dan dapat berbeda sesuai kebijakan bank & profil risiko nasabah.")
-    st.button("Mulai Konsultasi", on_click=complete_setup, type="primary")
+        with st.expander("Kebijakan Perhitungan (opsional)"):
+            cc1, cc2 = st.columns(2)
+            with cc1:
+                # keep slider for good UX; shows no trailing .0 due to formatting later
+                st.session_state["max_dsr"] = st.slider(
+                    "Batas DSR (Debt Service Ratio)", 0.10, 0.70, float(st.session_state["max_dsr"]), 0.01
+                )
+            with cc2:
+                st.session_state["max_ltv"] = st.slider(
+                    "Batas Maks LTV (Loan-to-Value)", 0.5, 1.0, float(st.session_state["max_ltv"]), 0.01
+                )
+
+        st.caption("**Catatan:** angka-angka ini simulasi dan dapat berbeda sesuai kebijakan bank & profil risiko nasabah.")
+        submitted = st.form_submit_button("Mulai Konsultasi", type="primary")
+
+    # Not an on_click callback: callbacks run before this block re-parses the submitted inputs
+    if submitted:
+        complete_setup()
+        st.rerun()
 
 # -----------------------------------------------------------------------------
 # Chat stage (Gemini) — only after setup
 # -----------------------------------------------------------------------------
-def monthly_payment(principal: float, annual_rate_pct: float, years: int) -> float:
-    if principal <= 0 or years <= 0:
-        return 0.0
-    r = (annual_rate_pct / 100.0) / 12.0
-    n = years * 12
-    if r == 0:
-        return principal / n
-    try:
-        return principal * r / (1 - (1 + r) ** (-n))
-    except ZeroDivisionError:
-        return 0.0
+# Static role/style rules; the per-nasabah profile follows as its own system message.
+# No Gemini context caching is used: the prompt is far below the minimum cacheable size.
+BANKER_INSTRUCTIONS = """Anda Personal Banking Officer KPR berpengalaman. Beri nasihat praktis & bertanggung jawab; tekankan manajemen risiko dan syarat pengajuan KPR.
+Aturan:
+- Bahasa Indonesia ramah, singkat, jelas; sapa nasabah dengan namanya.
+- Beri langkah konkret (mis. tambah DP, ubah tenor, fixed/floating).
+- Jangan janjikan persetujuan kredit.
+- Tekankan histori SLIK OJK sangat berpengaruh.
+- Jelaskan opsi: fixed vs floating, take over, KPR syariah, penalti pelunasan, biaya.
+- Sarankan siapkan dokumen & cek skor kredit bila relevan.
+- Jika data kurang, tanya klarifikasi satu per satu."""
+
+def build_banker_context(nama: str, tenor: int, fmt: dict) -> str:
+    """Compact nasabah profile and initial figures, filled from the preformatted snapshot values."""
+    return (
+        f"Profil: nama {nama}; gaji bersih/bln {fmt['gaji']}; pengeluaran/bln {fmt['peng']}; "
+        f"harga properti {fmt['harga']}; DP {fmt['dp']}; tenor {tenor} th; bunga {fmt['bunga']}% p.a.; "
+        f"batas DSR {fmt['max_dsr_pct']}; batas LTV {fmt['max_ltv_pct']}.\n"
+        f"Hitungan awal: pinjaman {fmt['need_loan']}; angsuran/bln {fmt['pay_est']}; "
+        f"DSR {fmt['dsr_pct']}; LTV {fmt['ltv_pct']}; maks pokok sesuai DSR {fmt['max_principal_dsr']}."
+    )
 
-def max_principal_from_dsr(net_income: float, expenses: float, dsr: float, annual_rate_pct: float, years: int) -> float:
-    capacity = max(0.0, (net_income - expenses) * dsr)
-    r = (annual_rate_pct / 100.0) / 12.0
-    n = years * 12
-    if r == 0:
-        return capacity * n
-    try:
-        return capacity * (1 - (1 + r) ** (-n)) / r
-    except ZeroDivisionError:
-        return 0.0
+@st.cache_data
+def build_snapshot(
+    nama: str, gaji: float, peng: float, harga: float, dp: float, tenor: int, bunga: float,
+    max_dsr: float, max_ltv: float,
+) -> dict:
+    """
+    Affordability math, display strings and banker prompt for one set of onboarding inputs.
+    Every value is formatted exactly once; unchanged reruns are a single cache lookup.
+    """
+    need_loan = max(0.0, harga - dp)
+    ltv = need_loan / harga if harga > 0 else 0.0
+    pay_est = monthly_payment(need_loan, bunga, tenor)
+    max_principal_dsr = max_principal_from_dsr(gaji, peng, max_dsr, bunga, tenor)
+    dsr_used = (pay_est / max(1.0, gaji - peng)) if (gaji - peng) > 0 else 0.0
+
+    fmt = {
+        "gaji": rupiah(gaji),
+        "peng": rupiah(peng),
+        "harga": rupiah(harga),
+        "dp": rupiah(dp),
+        "bunga": format_decimal_with_commas(bunga),
+        "need_loan": rupiah(need_loan),
+        "pay_est": rupiah(pay_est),
+        "max_principal_dsr": rupiah(max_principal_dsr),
+        "dsr_pct": f"{dsr_used*100:,.0f}%",
+        "ltv_pct": f"{ltv*100:,.0f}%",
+        "max_dsr_pct": f"{max_dsr*100:,.0f}%",
+        "max_ltv_pct": f"{max_ltv*100:,.0f}%",
+    }
+    return {
+        "fmt": fmt,
+        "dsr_flag": dsr_used <= max_dsr if (gaji - peng) > 0 else False,
+        "ltv_flag": ltv <= max_ltv if harga > 0 else True,
+        "banker_context": build_banker_context(nama, tenor, fmt),
+    }
 
 def ensure_messages_initialized(sys_prompt: str, banker_context: str):
+    # History is kept as LangChain message objects so it can be passed to the LLM as-is
     if "messages" not in st.session_state:
-        st.session_state.messages: List[dict] = []
+        st.session_state.messages: List[BaseMessage] = []
+        st.session_state.messages.append(SystemMessage(content=BANKER_INSTRUCTIONS))
         if banker_context.strip():
-            st.session_state.messages.append({"role": "system", "content": banker_context.strip()})
+            st.session_state.messages.append(SystemMessage(content=banker_context.strip()))
         if sys_prompt.strip():
-            st.session_state.messages.append({"role": "system", "content": sys_prompt.strip()})
+            st.session_state.messages.append(SystemMessage(content=sys_prompt.strip()))
+
+def windowed_history(messages: List[BaseMessage], max_turns: int = MAX_HISTORY_TURNS) -> List[BaseMessage]:
+    """
+    All system messages plus the last `max_turns` user/assistant pairs and the pending question.
+    The window always opens on a user turn, so no answer is sent without its question.
+    """
+    system = [m for m in messages if isinstance(m, SystemMessage)]
+    chat = [m for m in messages if not isinstance(m, SystemMessage)]
+    window = chat[-(2 * max_turns + 1):]
+    while window and not isinstance(window[0], HumanMessage):
+        window = window[1:]
+    return system + window
 
 if st.session_state.setup_complete:
+    # Deferred until the chat stage; these become module globals for the helpers above
+    from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+
     # Sidebar settings
     with st.sidebar:
         st.header("⚙️ Model Settings")
@@ -301,18 +381,8 @@ if st.session_state.setup_complete:
         )
         st.stop()
 
-    # Initialize LLM if config changed
-    needs_reinit = (
-        "llm" not in st.session_state
-        or st.session_state.get("_last_key") != google_api_key
-        or st.session_state.get("_last_model") != model
-        or st.session_state.get("_last_temp") != temperature
-    )
-    if needs_reinit:
-        st.session_state.llm = init_llm(google_api_key, model, temperature)
-        st.session_state._last_key = google_api_key
-        st.session_state._last_model = model
-        st.session_state._last_temp = temperature
+    # Initialize LLM (cached per key/model/temperature)
+    st.session_state.llm = init_llm(google_api_key, model, temperature)
 
     # Reset conversation
     if reset_btn:
@@ -330,28 +400,27 @@ if st.session_state.setup_complete:
     max_dsr = float(st.session_state.get("max_dsr", DEFAULT_MAX_DSR))
     max_ltv = float(st.session_state.get("max_ltv", DEFAULT_MAX_LTV))
 
-    need_loan = max(0.0, harga - dp)
-    ltv = need_loan / harga if harga > 0 else 0.0
-    pay_est = monthly_payment(need_loan, bunga, tenor)
-    max_principal_dsr = max_principal_from_dsr(gaji_bersih, pengeluaran, max_dsr, bunga, tenor)
-    dsr_used = (pay_est / max(1.0, gaji_bersih - pengeluaran)) if (gaji_bersih - pengeluaran) > 0 else 0.0
+    snapshot = build_snapshot(
+        nama, gaji_bersih, pengeluaran, harga, dp, tenor, bunga, max_dsr, max_ltv
+    )
+    fmt = snapshot["fmt"]
 
     # Display snapshot
     st.subheader("Ringkasan Simulasi", divider="rainbow")
     colA, colB, colC = st.columns(3)
     with colA:
-        st.metric("Kebutuhan Pinjaman", rupiah(need_loan))
-        st.metric("Angsuran / bulan (est.)", rupiah(pay_est))
+        st.metric("Kebutuhan Pinjaman", fmt["need_loan"])
+        st.metric("Angsuran / bulan (est.)", fmt["pay_est"])
     with colB:
-        st.metric("DSR Terpakai (est.)", f"{dsr_used*100:,.0f}%")
-        st.metric("Batas DSR", f"{max_dsr*100:,.0f}%")
+        st.metric("DSR Terpakai (est.)", fmt["dsr_pct"])
+        st.metric("Batas DSR", fmt["max_dsr_pct"])
     with colC:
-        st.metric("LTV (pinjaman/harga)", f"{ltv*100:,.0f}%")
-        st.metric("Batas LTV", f"{max_ltv*100:,.0f}%")
+        st.metric("LTV (pinjaman/harga)", fmt["ltv_pct"])
+        st.metric("Batas LTV", fmt["max_ltv_pct"])
 
     # Compliance hints
-    dsr_flag = dsr_used <= max_dsr if (gaji_bersih - pengeluaran) > 0 else False
-    ltv_flag = ltv <= max_ltv if harga > 0 else True
+    dsr_flag = snapshot["dsr_flag"]
+    ltv_flag = snapshot["ltv_flag"]
     if not dsr_flag or not ltv_flag:
         st.warning(
             "⚠️ Catatan kelayakan awal:\n"
@@ -361,78 +430,38 @@ if st.session_state.setup_complete:
         )
 
     # ------------------ Banker role system prompt ------------------
-    banker_context = f"""
-Anda adalah **Personal Banking Officer** berpengalaman yang membantu nasabah mengambil keputusan KPR secara bijak.
-Berikan nasihat praktis dan bertanggung jawab, tekankan manajemen risiko, syarat pengajuan KPR.
-
-Profil nasabah:
-- Nama: {nama}
-- Gaji bersih bulanan: {rupiah(gaji_bersih)}
-- Total pengeluaran bulanan: {rupiah(pengeluaran)}
-- Harga properti: {rupiah(harga)}
-- DP: {rupiah(dp)}
-- Tenor: {tenor} tahun
-- Bunga: {format_decimal_with_commas(bunga)}% p.a.
-- Batas DSR kebijakan: {max_dsr*100:,.0f}%
-- Batas LTV kebijakan: {max_ltv*100:,.0f}%
-
-Perhitungan awal:
-- Kebutuhan pinjaman: {rupiah(need_loan)}
-- Perkiraan angsuran/bulan: {rupiah(pay_est)}
-- DSR terpakai (estimasi): {dsr_used*100:,.0f}%
-- LTV: {ltv*100:,.0f}%
-- Estimasi maksimum pokok pinjaman sesuai DSR: {rupiah(max_principal_dsr)}
-
-Instruksi gaya & batasan:
-- Gunakan bahasa Indonesia yang ramah, sopan, singkat, dan jelas dalam penyebutan nama nasabah.
-- Tawarkan langkah-langkah konkret (contoh: tambah DP sekian, pilih tenor sekian, opsi fix-floating).
-- Jangan memberikan janji persetujuan kredit.
-- Jelaskan dalam proses pengajuan KPR histori SLIK OJK sangat berpengaruh.
-- Jelaskan opsi (fixed vs floating, take over KPR, KPR syariah, penalty pelunasan, biaya-biaya).
-- Sarankan pengumpulan dokumen dan pengecekan skor kredit bila relevan.
-- Jika data kurang, ajukan pertanyaan klarifikasi satu per satu.
-"""
+    banker_context = snapshot["banker_context"]
 
     # Initialize messages once
     ensure_messages_initialized(sys_prompt=sys_prompt, banker_context=banker_context)
 
     # Render chat history (skip system messages)
     for msg in st.session_state.messages:
-        if msg["role"] == "system":
+        if isinstance(msg, SystemMessage):
             continue
-        with st.chat_message("user" if msg["role"] == "user" else "assistant"):
-            st.markdown(msg["content"])
-
-    # Resolve API key for chat
-    google_api_key = resolve_google_api_key()
-    if not google_api_key:
-        st.stop()
+        with st.chat_message("user" if isinstance(msg, HumanMessage) else "assistant"):
+            st.markdown(msg.content)
 
     # Chat input
     user_text = st.chat_input("Tulis pertanyaan Anda tentang KPR…")
     if user_text:
-        st.session_state.messages.append({"role": "user", "content": user_text})
+        st.session_state.messages.append(HumanMessage(content=user_text))
         with st.chat_message("user"):
             st.markdown(user_text)
 
-        # Convert to LangChain messages
-        lc_messages = []
-        for m in st.session_state.messages:
-            if m["role"] == "system":
-                lc_messages.append(SystemMessage(content=m["content"]))
-            elif m["role"] == "user":
-                lc_messages.append(HumanMessage(content=m["content"]))
-            else:
-                lc_messages.append(AIMessage(content=m["content"]))
-
         # Generate response
         try:
             with st.chat_message("assistant"):
-                with st.spinner("Sedang menganalisis…"):
-                    result = st.session_state.llm.invoke(lc_messages)
-                    ai_text = getattr(result, "content", str(result))
-                    st.markdown(ai_text)
-            st.session_state.messages.append({"role": "assistant", "content": ai_text})
+                # Stream tokens as they arrive; write_stream returns the full text
+                ai_text = st.write_stream(
+                    stream_coalesced(
+                        st.session_state.llm,
+                        windowed_history(st.session_state.messages),
+                        model,
+                        temperature,
+                    )
+                )
+            st.session_state.messages.append(AIMessage(content=ai_text))
         except Exception as e:
 
             st.error(f"Error: {e}")
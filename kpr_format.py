@@ -0,0 +1,29 @@
+"""Memoized number formatting cores for KPR.AI; these may raise, the kpr2.py wrappers catch."""
+from functools import lru_cache
+
+
+@lru_cache(maxsize=256)
+def rupiah_cached(x: float) -> str:
+    return f"Rp{int(round(x)):,.0f}"
+
+
+@lru_cache(maxsize=256)
+def int_cached(x: float) -> str:
+    return f"{int(round(x)):,.0f}"
+
+
+@lru_cache(maxsize=256)
+def decimal_trim_cached(x: float) -> str:
+    s = f"{float(x)}"
+    if "." in s:
+        s = s.rstrip("0").rstrip(".")
+    return s
+
+
+@lru_cache(maxsize=256)
+def decimal_with_commas_cached(x: float) -> str:
+    s = decimal_trim_cached(x)
+    if "." in s:
+        int_part, frac = s.split(".", 1)
+        return f"{int(int_part):,}.{frac}"
+    return f"{int(s):,}"
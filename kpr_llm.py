@@ -0,0 +1,89 @@
+"""Single-flight coalescing and short-lived result cache for identical Gemini calls."""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Dict, Iterator, List, Tuple
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+RESULT_TTL_SECONDS = 60.0
+
+_lock = threading.Lock()
+_inflight: Dict[str, Future] = {}
+_done: Dict[str, Tuple[float, str]] = {}  # key -> (expires_at, text)
+
+
+def chunk_text(chunk) -> str:
+    """Plain text of a streamed chunk; content may be a str or a list of str/text blocks."""
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        pieces = []
+        for part in content:
+            if isinstance(part, str):
+                pieces.append(part)
+            elif isinstance(part, dict) and part.get("type", "text") == "text":
+                pieces.append(str(part.get("text", "")))
+        return "".join(pieces)
+    return str(content)
+
+
+def request_key(messages: List[BaseMessage], *settings) -> str:
+    payload = [list(settings), [(m.type, m.content) for m in messages]]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def stream_coalesced(llm, messages: List[BaseMessage], *settings) -> Iterator[str]:
+    """
+    Yield the response text for `messages`, streaming token chunks when this
+    caller is the one hitting the API. Followers of an identical in-flight
+    request, and cache hits, receive the full text as a single chunk.
+    `settings` (e.g. model name, temperature) are folded into the key.
+    """
+    key = request_key(messages, *settings)
+    now = time.monotonic()
+    with _lock:
+        for k in [k for k, (expires_at, _) in _done.items() if expires_at <= now]:
+            del _done[k]
+        if key in _done:
+            cached = _done[key][1]
+            future = None
+        else:
+            cached = None
+            future = _inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                _inflight[key] = future
+
+    if cached is not None:
+        yield cached
+        return
+    if not leader:
+        yield future.result()
+        return
+
+    parts: List[str] = []
+    try:
+        for chunk in llm.stream(messages):
+            text = chunk_text(chunk)
+            parts.append(text)
+            yield text
+    except BaseException as e:
+        with _lock:
+            _inflight.pop(key, None)
+        # GeneratorExit / Streamlit rerun signals must not be re-raised in followers
+        future.set_exception(e if isinstance(e, Exception) else RuntimeError("Permintaan dibatalkan."))
+        raise
+
+    text = "".join(parts)
+    with _lock:
+        _inflight.pop(key, None)
+        _done[key] = (time.monotonic() + RESULT_TTL_SECONDS, text)
+    future.set_result(text)
@@ -0,0 +1,70 @@
+"""Amortization kernels for KPR.AI, compiled eagerly to native code with Numba."""
+import numpy as np
+from numba import njit
+
+# Annuity factors precomputed for the UI's range: tenor 1-30 years and
+# rates 0-25% on a 0.01% (1 bps) grid.
+MAX_TABLE_YEARS = 30
+MAX_TABLE_RATE_BPS = 2500
+
+
+@njit("float64(float64, int64)", cache=True)
+def annuity_factor(r, n):
+    """Monthly payment per unit of principal for monthly rate `r` over `n` months."""
+    if r == 0:
+        return 1.0 / n
+    denom = 1 - (1 + r) ** (-n)
+    # tiny rates can round (1 + r) ** -n to exactly 1; njit raises ZeroDivisionError like Python
+    if denom == 0:
+        return 0.0
+    return r / denom
+
+
+def _build_factor_table(max_years, max_bps):
+    # Plain NumPy over the (years, bps) grid: ~31x2501 entries, built in a few ms.
+    # Row 0 (zero tenor) stays 0; the r == 0 column is 1/n.
+    n = (np.arange(1, max_years + 1, dtype=np.float64) * 12)[:, None]
+    r = ((np.arange(max_bps + 1, dtype=np.float64) / 100.0) / 100.0) / 12.0
+    r = np.broadcast_to(r[None, :], (max_years, max_bps + 1))
+    table = np.zeros((max_years + 1, max_bps + 1), dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        table[1:] = np.where(r == 0, 1.0 / n, r / (1 - (1 + r) ** (-n)))
+    return table
+
+
+FACTOR = _build_factor_table(MAX_TABLE_YEARS, MAX_TABLE_RATE_BPS)
+
+
+@njit("float64(float64, float64, int64)", cache=True)
+def monthly_payment_closed_form(principal, annual_rate_pct, years):
+    if principal <= 0 or years <= 0:
+        return 0.0
+    return principal * annuity_factor((annual_rate_pct / 100.0) / 12.0, years * 12)
+
+
+# The table is an argument rather than a global so Numba doesn't freeze it into
+# the compiled code (and its on-disk cache) as a constant.
+@njit("float64(float64, float64, int64, float64[:, ::1])", cache=True)
+def _monthly_payment_lookup(principal, annual_rate_pct, years, table):
+    if principal <= 0 or years <= 0:
+        return 0.0
+    bps = annual_rate_pct * 100.0
+    b = int(round(bps))
+    # Table hit only when the rate sits exactly on the 1 bps grid
+    if years <= MAX_TABLE_YEARS and 0 <= b <= MAX_TABLE_RATE_BPS and abs(bps - b) < 1e-6:
+        return principal * table[years, b]
+    return monthly_payment_closed_form(principal, annual_rate_pct, years)
+
+
+def monthly_payment(principal: float, annual_rate_pct: float, years: int) -> float:
+    return _monthly_payment_lookup(principal, annual_rate_pct, years, FACTOR)
+
+
+@njit("float64(float64, float64, float64, float64, int64)", cache=True)
+def max_principal_from_dsr(net_income, expenses, dsr, annual_rate_pct, years):
+    capacity = max(0.0, (net_income - expenses) * dsr)
+    r = (annual_rate_pct / 100.0) / 12.0
+    n = years * 12
+    if r == 0:
+        return capacity * n
+    return capacity * (1 - (1 + r) ** (-n)) / r